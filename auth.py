@@ -1,5 +1,6 @@
 import os
 import httpx
+from urllib.parse import quote
 from itsdangerous import URLSafeSerializer
 from fastapi import HTTPException
 from dotenv import load_dotenv
@@ -11,21 +12,45 @@ CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
 CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
 REDIRECT_URI = os.getenv("GOOGLE_REDIRECT_URI")
 
+if not CLIENT_ID or not REDIRECT_URI:
+    raise RuntimeError("GOOGLE_CLIENT_ID and GOOGLE_REDIRECT_URI must be set (see .env.example)")
+
 serializer = URLSafeSerializer(os.getenv("SECRET_KEY", "supersecret"))
 
-def get_login_url(state: str):
-    return (
-        "https://accounts.google.com/o/oauth2/v2/auth"
-        f"?response_type=code"
-        f"&client_id={CLIENT_ID}"
-        f"&redirect_uri={REDIRECT_URI}"
-        f"&scope=openid%20email%20profile"
-        f"&state={state}"
-        f"&hd=unesa.ac.id"
+# Shared HTTP client, opened on app startup so Google connections are reused
+client: httpx.AsyncClient | None = None
+
+async def startup():
+    global client
+    # HTTP/2 multiplexes concurrent logins over the pooled connections to Google
+    client = httpx.AsyncClient(
+        http2=True,
+        timeout=httpx.Timeout(5.0, connect=2.0),
+        limits=httpx.Limits(max_keepalive_connections=20),
     )
 
+async def shutdown():
+    global client
+    if client is not None:
+        await client.aclose()
+        client = None
+
+# Everything but the state is fixed per process, so build the URL prefix once
+_LOGIN_BASE = (
+    "https://accounts.google.com/o/oauth2/v2/auth"
+    "?response_type=code"
+    f"&client_id={quote(CLIENT_ID, safe='')}"
+    f"&redirect_uri={quote(REDIRECT_URI, safe='')}"
+    "&scope=openid%20email%20profile"
+    "&hd=unesa.ac.id"
+    "&state="
+)
+
+def get_login_url(state: str):
+    return _LOGIN_BASE + quote(state, safe="")
+
 async def get_user_info(code: str):
-    async with httpx.AsyncClient() as client:
+    try:
         token_res = await client.post(
             "https://oauth2.googleapis.com/token",
             data={
@@ -37,8 +62,14 @@ async def get_user_info(code: str):
             },
         )
         access_token = token_res.json().get("access_token")
+        if not access_token:
+            raise HTTPException(status_code=400, detail="Login Google gagal, silakan coba lagi.")
         userinfo_res = await client.get(
             "https://www.googleapis.com/oauth2/v2/userinfo",
             headers={"Authorization": f"Bearer {access_token}"},
         )
+        userinfo_res.raise_for_status()
         return userinfo_res.json()
+    except (httpx.HTTPError, ValueError):
+        # Timeouts, connection failures, error statuses and non-JSON bodies from Google
+        raise HTTPException(status_code=502, detail="Google tidak dapat dihubungi, silakan coba lagi.")
@@ -0,0 +1,51 @@
+import os, json
+import redis.asyncio as redis
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+REDIS_URL = os.getenv("REDIS_URL")
+
+# Caching is optional: without REDIS_URL every lookup is a miss and writes are no-ops
+client = redis.from_url(REDIS_URL, decode_responses=True) if REDIS_URL else None
+
+USER_TTL = 300
+STATS_TTL = 300
+SURVEY_TTL = 60
+
+def user_key(email: str) -> str:
+    return f"u:{email}"
+
+def survey_key(kid: int) -> str:
+    return f"survey:{kid}"
+
+async def get_json(key: str):
+    """Return the cached value for key, or None on a miss / Redis error"""
+    if client is None:
+        return None
+    try:
+        raw = await client.get(key)
+    except redis.RedisError:
+        return None
+    return json.loads(raw) if raw else None
+
+async def set_json(key: str, value, ttl: int):
+    if client is None:
+        return
+    try:
+        await client.setex(key, ttl, json.dumps(value))
+    except redis.RedisError:
+        pass
+
+async def delete(*keys: str):
+    if client is None or not keys:
+        return
+    try:
+        await client.delete(*keys)
+    except redis.RedisError:
+        pass
+
+async def close():
+    if client is not None:
+        await client.aclose()
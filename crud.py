@@ -1,94 +1,180 @@
-import models, json
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+import models, cache
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import selectinload, load_only
 import datetime
 from typing import Optional
 from fastapi import HTTPException
 
-def get_or_create_user(db: Session, email: str, nama: str, role: str = "user", photo_url: str = None):
-    user = db.query(models.User).filter(models.User.email == email).first()
+# INSERT ... ON CONFLICT DO NOTHING per dialect (Postgres in production, SQLite for local runs)
+_INSERT_IGNORE = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+def _insert_responses(db: AsyncSession, rows: list):
+    # database.py refuses any other dialect at startup
+    insert = _INSERT_IGNORE[db.get_bind().dialect.name]
+    return insert(models.Response).values(rows).on_conflict_do_nothing(
+        index_elements=["user_id", "question_id"]
+    ).returning(models.Response.id)
+
+async def get_or_create_user(db: AsyncSession, email: str, nama: str, role: str = "user", photo_url: str = None):
+    user = (await db.execute(select(models.User).where(models.User.email == email))).scalar_one_or_none()
     if user:
         # Update existing user's name and photo if provided
         if nama:
             user.nama = nama
         if photo_url:
             user.photo_url = photo_url
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
+        await cache.delete(cache.user_key(email))
         return user
     u = models.User(email=email, nama=nama, role=role, photo_url=photo_url)
     db.add(u)
-    db.commit()
-    db.refresh(u)
+    await db.commit()
+    await db.refresh(u)
     return u
 
-def create_kuisioner(db: Session, title: str, owner_id: int, desc: str = None, bg: str = "white"):
+async def get_user_by_email(db: AsyncSession, email: str):
+    return (await db.execute(select(models.User).where(models.User.email == email))).scalar_one_or_none()
+
+async def create_kuisioner(db: AsyncSession, title: str, owner_id: int, desc: str = None, bg: str = "white"):
     k = models.Kuisioner(title=title, owner_id=owner_id, description=desc, background=bg)
     db.add(k)
-    db.commit()
-    db.refresh(k)
+    await db.commit()
+    await db.refresh(k)
     return k
 
-def add_question(db, kuisioner_id, text, qtype, options=None, media_url=None, required=False):
+async def add_question(db, kuisioner_id, text, qtype, options: Optional[list] = None, media_url=None, required=False):
     question = models.Question(
         kuisioner_id=kuisioner_id,
         text=text,
         qtype=qtype,
-        options=json.dumps(options) if options else None,
+        options=options,
         media_url=media_url,
         required=required
     )
     db.add(question)
-    db.commit()
-    db.refresh(question)
+    await db.commit()
+    await db.refresh(question)
+    await cache.delete(cache.survey_key(kuisioner_id))
     return question
 
-def get_kuisioner(db: Session, kid: int):
-    return db.query(models.Kuisioner).filter(models.Kuisioner.id == kid).first()
+async def get_kuisioner(db: AsyncSession, kid: int):
+    # Questions are rendered by every caller; load them up front (no lazy loads on AsyncSession)
+    return (await db.execute(
+        select(models.Kuisioner)
+        .options(selectinload(models.Kuisioner.questions))
+        .where(models.Kuisioner.id == kid)
+    )).scalar_one_or_none()
+
+async def get_question_ids(db: AsyncSession, kid: int):
+    return (await db.execute(
+        select(models.Question.id).where(models.Question.kuisioner_id == kid)
+    )).scalars().all()
+
+async def delete_kuisioner(db: AsyncSession, kid: int, owner_id: int):
+    """Delete a kuisioner with its questions and responses; False if not owned by owner_id"""
+    owned = (await db.execute(
+        select(models.Kuisioner.id).where(models.Kuisioner.id == kid, models.Kuisioner.owner_id == owner_id)
+    )).scalar_one_or_none()
+    if owned is None:
+        return False
+
+    # Set-based deletes: the question ids never round-trip through Python
+    question_ids = select(models.Question.id).where(models.Question.kuisioner_id == kid)
+    await db.execute(delete(models.Response).where(models.Response.question_id.in_(question_ids)))
+    await db.execute(delete(models.Question).where(models.Question.kuisioner_id == kid))
+    await db.execute(delete(models.Kuisioner).where(models.Kuisioner.id == kid))
+    await db.commit()
+    await cache.delete(cache.survey_key(kid))
+    return True
 
-def get_user_kuisioners(db: Session, uid: int):
-    return db.query(models.Kuisioner).filter(models.Kuisioner.owner_id == uid).all()
+async def get_user_kuisioners(db: AsyncSession, uid: int):
+    # The dashboard only shows id and title; newest first, served by the owner_id index
+    return (await db.execute(
+        select(models.Kuisioner)
+        .options(load_only(models.Kuisioner.id, models.Kuisioner.title))
+        .where(models.Kuisioner.owner_id == uid)
+        .order_by(models.Kuisioner.id.desc())
+    )).scalars().all()
 
-def get_response_statistics(db: Session, kid: int):
-    """Get detailed response statistics with user information"""
-    results = db.query(
+def response_rows_query(kid: int):
+    """Select only the response columns that the CSV export writes"""
+    return select(
         models.Response.answer,
         models.User.nama,
         models.User.email,
-        models.Question.text
+        models.Question.text.label("question")
+    ).join(
+        models.Question, models.Response.question_id == models.Question.id
+    ).join(
+        models.User, models.Response.user_id == models.User.id
+    ).where(
+        models.Question.kuisioner_id == kid
+    )
+
+def answer_rows_query(kid: int):
+    """Narrow rows for charts and text analytics: no per-row copy of the question text"""
+    return select(
+        models.Response.answer,
+        models.User.nama,
+        models.User.email
     ).join(
         models.Question, models.Response.question_id == models.Question.id
     ).join(
         models.User, models.Response.user_id == models.User.id
-    ).filter(
+    ).where(
         models.Question.kuisioner_id == kid
-    ).all()
-    return results
+    )
 
-def create_response(db: Session, user_id: int, question_id: int, answer: str):
-    # Check if response already exists
-    existing = db.query(models.Response).filter_by(user_id=user_id, question_id=question_id).first()
-    if existing:
+def _latest_response_id(kid: int):
+    return (
+        select(func.max(models.Response.id))
+        .join(models.Question, models.Response.question_id == models.Question.id)
+        .where(models.Question.kuisioner_id == kid)
+    )
+
+async def get_latest_response_id(db: AsyncSession, kid: int):
+    """Highest response id of a kuisioner; changes whenever a new answer arrives"""
+    return (await db.execute(_latest_response_id(kid))).scalar()
+
+async def get_kuisioner_with_latest_response(db: AsyncSession, kid: int):
+    """(kuisioner, latest response id) in one round-trip; kuisioner is None if missing"""
+    row = (await db.execute(
+        select(models.Kuisioner, _latest_response_id(kid).scalar_subquery())
+        .where(models.Kuisioner.id == kid)
+    )).first()
+    return (row[0], row[1]) if row else (None, None)
+
+async def stream_responses(db: AsyncSession, kid: int, batch_size: int = 1000):
+    """Yield response rows in batches from a server-side cursor"""
+    stmt = response_rows_query(kid).order_by(models.Response.id).execution_options(yield_per=batch_size)
+    result = await db.stream(stmt)
+    async for batch in result.partitions():
+        yield batch
+
+async def create_responses(db: AsyncSession, user_id: int, answers: dict):
+    """Insert all answers of one survey submission in a single statement"""
+    if not answers:
+        return
+    rows = [{"user_id": user_id, "question_id": qid, "answer": ans} for qid, ans in answers.items()]
+    inserted = (await db.execute(_insert_responses(db, rows))).scalars().all()
+    # Any skipped row means this user already answered; keep the submission all-or-nothing
+    if len(inserted) < len(rows):
+        await db.rollback()
         raise HTTPException(
             status_code=400,
             detail="Maaf, Anda sudah mengisi kuisioner ini sebelumnya."
         )
-    
-    db_response = models.Response(
-        answer=answer,
-        user_id=user_id,
-        question_id=question_id
-    )
-    db.add(db_response)
-    db.commit()
-    db.refresh(db_response)
-    return db_response
+    await db.commit()
 
-def get_responses_by_kuisioner(db: Session, kid: int):
-    return db.query(models.Response).join(models.Question).filter(models.Question.kuisioner_id == kid).all()
+async def get_responses_by_kuisioner(db: AsyncSession, kid: int):
+    # Flat (answer, nama, email) rows instead of ORM objects with lazy relations
+    return (await db.execute(answer_rows_query(kid))).all()
 
-def update_kuisioner(
-    db: Session,
+async def update_kuisioner(
+    db: AsyncSession,
     kuisioner_id: int,
     title: Optional[str] = None,
     description: Optional[str] = None,
@@ -97,7 +183,7 @@ def update_kuisioner(
     access: Optional[str] = None,
     end_date: Optional[datetime.datetime] = None
 ):
-    k = db.query(models.Kuisioner).filter(models.Kuisioner.id == kuisioner_id).first()
+    k = await db.get(models.Kuisioner, kuisioner_id)
     if not k:
         return None
 
@@ -120,19 +206,20 @@ def update_kuisioner(
         else:
             k.end_date = end_date
 
-    db.commit()
-    db.refresh(k)
+    await db.commit()
+    await db.refresh(k)
+    await cache.delete(cache.survey_key(kuisioner_id))
     return k
 
-def update_question(
-    db: Session,
+async def update_question(
+    db: AsyncSession,
     question_id: int,
     text: Optional[str] = None,
     qtype: Optional[str] = None,
     options: Optional[list] = None,
     media: Optional[str] = None
 ):
-    q = db.query(models.Question).filter(models.Question.id == question_id).first()
+    q = await db.get(models.Question, question_id)
     if not q:
         return None
 
@@ -141,10 +228,11 @@ def update_question(
     if qtype is not None:
         q.qtype = qtype
     if options is not None:
-        q.options = json.dumps(options) if isinstance(options, list) else options
+        q.options = options
     if media is not None:
         q.media = media
 
-    db.commit()
-    db.refresh(q)
+    await db.commit()
+    await db.refresh(q)
+    await cache.delete(cache.survey_key(q.kuisioner_id))
     return q
@@ -1,28 +1,73 @@
-from fastapi import FastAPI, Request, Depends, Form
-from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse
+from fastapi import FastAPI, Request, Depends, Form, HTTPException
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse, ORJSONResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy.orm import Session
-import models, crud, auth, utils, os
-from database import Base, engine, get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from contextlib import asynccontextmanager
+from itsdangerous import BadSignature
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing, asyncio
+import models, crud, auth, utils, cache, os
+from database import engine, AsyncSessionLocal, get_db, WEB_CONCURRENCY
 
-Base.metadata.create_all(bind=engine)
+# Every uvicorn worker owns a pool; split the cores between them
+CPU_WORKERS = max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY)
 
-app = FastAPI(title="Kuisioner UNESA")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await auth.startup()
+    # Worker processes for chart rendering and NLP; spawned, not forked, since the server is threaded
+    app.state.cpu_pool = ProcessPoolExecutor(
+        max_workers=CPU_WORKERS, mp_context=multiprocessing.get_context("spawn"), initializer=utils.warm_up_worker
+    )
+    # Workers are only spawned on submit: start (and warm) all of them now, not on the first stats request
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*(loop.run_in_executor(app.state.cpu_pool, os.getpid) for _ in range(CPU_WORKERS)))
+    yield
+    # Waiting for running renders blocks; do it off the event loop
+    await asyncio.to_thread(app.state.cpu_pool.shutdown, cancel_futures=True)
+    await auth.shutdown()
+    await cache.close()
+    await engine.dispose()
+
+# JSON endpoints (analytics) return large nested payloads; orjson encodes them much faster
+app = FastAPI(title="Kuisioner UNESA", lifespan=lifespan, default_response_class=ORJSONResponse)
 templates = Jinja2Templates(directory="templates")
 
 # Mount static files
 os.makedirs("static/charts", exist_ok=True)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
+async def session_user(request: Request, db: AsyncSession = Depends(get_db)):
+    """Resolve the session cookie to a user (served from Redis when cached), or None"""
+    token = request.cookies.get("session")
+    if not token:
+        return None
+    try:
+        email = auth.serializer.loads(token)["email"]
+    except BadSignature:
+        return None
+    data = await cache.get_json(cache.user_key(email))
+    if data:
+        return models.User(**data)
+    user = await crud.get_user_by_email(db, email)
+    if user:
+        await cache.set_json(cache.user_key(email), user.to_dict(), cache.USER_TTL)
+    return user
+
+async def current_user(user: models.User = Depends(session_user)):
+    if user is None:
+        raise HTTPException(status_code=401, detail="Silakan login terlebih dahulu")
+    return user
+
 @app.get("/", response_class=HTMLResponse)
 def index(request: Request):
     return templates.TemplateResponse("indeks.html", {"request": request, "login_url": auth.get_login_url("state-unesa")})
 
 @app.get("/auth/callback")
-async def callback(code: str, state: str = None, db: Session = Depends(get_db)):
+async def callback(code: str, state: str = None, db: AsyncSession = Depends(get_db)):
     info = await auth.get_user_info(code)
-    user = crud.get_or_create_user(
+    user = await crud.get_or_create_user(
         db,
         email=info["email"],
         nama=info.get("name", info["email"]),
@@ -35,46 +80,53 @@ async def callback(code: str, state: str = None, db: Session = Depends(get_db)):
     return resp
 
 @app.get("/dashboard", response_class=HTMLResponse)
-def dashboard(request: Request, db: Session = Depends(get_db)):
-    token = request.cookies.get("session")
-    if not token: return RedirectResponse("/")
-    email = auth.serializer.loads(token)["email"]
-    user = db.query(models.User).filter(models.User.email == email).first()
-    kuisioners = crud.get_user_kuisioners(db, user.id)
+async def dashboard(request: Request, user: models.User = Depends(session_user), db: AsyncSession = Depends(get_db)):
+    if not user: return RedirectResponse("/")
+    kuisioners = await crud.get_user_kuisioners(db, user.id)
     return templates.TemplateResponse("dashboard.html", {"request": request, "user": user, "kuisioners": kuisioners})
 
 @app.post("/kuisioner/create")
-def create_kuisioner(title: str = Form(...), description: str = Form(None), background: str = Form("white"), db: Session = Depends(get_db), request: Request = None):
-    email = auth.serializer.loads(request.cookies.get("session"))["email"]
-    user = db.query(models.User).filter(models.User.email == email).first()
-    crud.create_kuisioner(db, title, user.id, description, background)
+async def create_kuisioner(title: str = Form(...), description: str = Form(None), background: str = Form("white"), user: models.User = Depends(current_user), db: AsyncSession = Depends(get_db)):
+    await crud.create_kuisioner(db, title, user.id, description, background)
     return RedirectResponse("/dashboard", status_code=303)
 
 @app.get("/kuisioner/{kid}", response_class=HTMLResponse)
-def view_kuisioner(request: Request, kid: int, db: Session = Depends(get_db)):
-    k = crud.get_kuisioner(db, kid)
+async def view_kuisioner(request: Request, kid: int, db: AsyncSession = Depends(get_db)):
+    k = await crud.get_kuisioner(db, kid)
     return templates.TemplateResponse("kuisioner.html", {"request": request, "kuisioner": k})
 
+@app.post("/kuisioner/{kid}/delete")
+async def delete_kuisioner(kid: int, user: models.User = Depends(current_user), db: AsyncSession = Depends(get_db)):
+    if not await crud.delete_kuisioner(db, kid, user.id):
+        raise HTTPException(status_code=404, detail="Kuisioner tidak ditemukan")
+    return RedirectResponse("/dashboard", status_code=303)
+
 @app.post("/kuisioner/{kid}/add_question")
-def add_question(kid: int, text: str = Form(...), qtype: str = Form("short_text"), options: str = Form(None), media: str = Form(None), db: Session = Depends(get_db)):
+async def add_question(kid: int, text: str = Form(...), qtype: str = Form("short_text"), options: str = Form(None), media: str = Form(None), db: AsyncSession = Depends(get_db)):
     opts = options.split(",") if options else None
-    crud.add_question(db, kid, text, qtype, opts, media)
+    await crud.add_question(db, kid, text, qtype, opts, media)
     return RedirectResponse(f"/kuisioner/{kid}", status_code=303)
 
 @app.get("/survey/{kid}", response_class=HTMLResponse)
-def survey(request: Request, kid: int, db: Session = Depends(get_db)):
-    k = crud.get_kuisioner(db, kid)
-    return templates.TemplateResponse("survey.html", {"request": request, "kuisioner": k})
+async def survey(request: Request, kid: int, db: AsyncSession = Depends(get_db)):
+    # Same page for every visitor until the owner edits it; crud writes drop the cached copy
+    html = await cache.get_json(cache.survey_key(kid))
+    if html is None:
+        k = await crud.get_kuisioner(db, kid)
+        if not k:
+            raise HTTPException(status_code=404, detail="Kuisioner tidak ditemukan")
+        html = templates.get_template("survey.html").render(request=request, kuisioner=k)
+        await cache.set_json(cache.survey_key(kid), html, cache.SURVEY_TTL)
+    return HTMLResponse(html, headers={"Cache-Control": f"public, max-age={cache.SURVEY_TTL}"})
 
 @app.post("/survey/{kid}")
-async def submit_survey(request: Request, kid: int, nama: str = Form(...), email: str = Form(...), db: Session = Depends(get_db)):
+async def submit_survey(request: Request, kid: int, nama: str = Form(...), email: str = Form(...), db: AsyncSession = Depends(get_db)):
     form = await request.form()
-    user = crud.get_or_create_user(db, email=email, nama=nama, role="user", photo_url=None)
-    k = crud.get_kuisioner(db, kid)
-    for q in k.questions:
-        ans = form.get(f"q_{q.id}")
-        if ans:
-            crud.create_response(db, user.id, q.id, ans)
+    user = await crud.get_or_create_user(db, email=email, nama=nama, role="user", photo_url=None)
+    # Only the question ids are needed to pick answers out of the form
+    qids = await crud.get_question_ids(db, kid)
+    answers = {qid: ans for qid in qids if (ans := form.get(f"q_{qid}"))}
+    await crud.create_responses(db, user.id, answers)
     return RedirectResponse("/thanks", status_code=303)
 
 @app.get("/thanks", response_class=HTMLResponse)
@@ -82,72 +134,145 @@ def thanks(request: Request):
     return HTMLResponse("<h2>Terima kasih sudah mengisi kuisioner 🎉</h2>")
 
 @app.get("/kuisioner/{kid}/export")
-def export_csv(kid: int, db: Session = Depends(get_db)):
-    res = crud.get_responses_by_kuisioner(db, kid)
-    path = utils.export_responses(res, f"kuisioner_{kid}.csv")
-    return FileResponse(path, filename=f"kuisioner_{kid}.csv")
+async def export_csv(kid: int):
+    async def iter_csv():
+        yield utils.responses_to_csv([], header=True)
+        # The body streams after request dependencies are closed, so use a dedicated session
+        async with AsyncSessionLocal() as db:
+            async for batch in crud.stream_responses(db, kid):
+                yield utils.responses_to_csv(batch)
+
+    return StreamingResponse(
+        iter_csv(),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="kuisioner_{kid}.csv"'}
+    )
+
+# Stats page charts: (context key, renderer, file prefix)
+STATS_CHARTS = [
+    ("chart", utils.chart_distribution, "chart"),
+    ("pie", utils.create_pie_chart, "pie"),
+    ("wc", utils.generate_wordcloud, "wc"),
+    ("word_freq", utils.create_word_frequency_chart, "word_freq"),
+    ("response_length", utils.create_response_length_chart, "response_length"),
+    ("top_contributors", utils.create_top_contributors_chart, "contributors"),
+]
+
+# Below this many distinct answers per worker, pickling a shard costs more than scoring it
+SENTIMENT_SHARD_MIN = 1000
+
+async def sharded_sentiment(pool: ProcessPoolExecutor, res):
+    """Sentiment analysis with the TextBlob scoring split over the worker processes"""
+    loop = asyncio.get_running_loop()
+    answers = list(dict.fromkeys(r.answer for r in res if r.answer))
+    size = max(SENTIMENT_SHARD_MIN, -(-len(answers) // CPU_WORKERS))
+    shards = [answers[i:i + size] for i in range(0, len(answers), size)]
+    if len(shards) <= 1:
+        # Nothing to split: score and classify in one task instead of two round-trips
+        return await loop.run_in_executor(pool, utils.analyze_sentiment, res)
+    polarities = {}
+    for part in await asyncio.gather(*(loop.run_in_executor(pool, utils.sentiment_polarities, shard) for shard in shards)):
+        polarities.update(part)
+    # Every answer is scored now, so classifying is just bucketing floats: do it here (in a thread,
+    # off the event loop) rather than pickle the rows and polarities to a worker again
+    return await asyncio.to_thread(utils.analyze_sentiment, res, polarities)
+
+def pooled(fn, *args):
+    """Analysis step running fn(res, *args) in a worker process"""
+    return lambda pool, res: asyncio.get_running_loop().run_in_executor(pool, fn, res, *args)
+
+# Charts drawn from an analysis the page also shows: (chart key, renderer, file prefix, result key, analysis)
+ANALYSIS_CHARTS = [
+    ("sentiment_chart", utils.create_sentiment_chart, "sentiment", "sentiment", sharded_sentiment),
+    ("keyword_chart", utils.create_keyword_comparison_chart, "keyword_chart", "keywords", pooled(utils.extract_keywords, 12)),
+    ("stats_dashboard", utils.create_comprehensive_stats_chart, "stats_dashboard", "text_stats", pooled(utils.text_statistics)),
+]
+STATS_KEYWORDS = 10
+
+def run_text_analytics(pool: ProcessPoolExecutor, res):
+    """LDA topics, keywords, sentiment and text statistics, run concurrently in the worker pool"""
+    loop = asyncio.get_running_loop()
+    return asyncio.gather(
+        loop.run_in_executor(pool, utils.lda_topic_modeling, res, 3, 5),
+        loop.run_in_executor(pool, utils.extract_keywords, res, 10),
+        sharded_sentiment(pool, res),
+        loop.run_in_executor(pool, utils.text_statistics, res),
+    )
+
+async def analyse_then_chart(pool: ProcessPoolExecutor, analyse, chart, res, filename: str):
+    """Run one analysis, then render its chart from that result instead of recomputing it"""
+    data = await analyse(pool, res)
+    return data, await asyncio.get_running_loop().run_in_executor(pool, chart, res, filename, data)
+
+async def build_stats(pool: ProcessPoolExecutor, res, kid: int):
+    """Render all charts and text analytics for the stats page in parallel worker processes"""
+    loop = asyncio.get_running_loop()
+    charts = [loop.run_in_executor(pool, fn, res, f"{prefix}_{kid}.png") for _, fn, prefix in STATS_CHARTS]
+    analysed = [analyse_then_chart(pool, analyse, fn, res, f"{prefix}_{kid}.png")
+                for _, fn, prefix, _, analyse in ANALYSIS_CHARTS]
+    # Topic modeling needs at least 3 responses; below that the page shows no topics
+    lda = [loop.run_in_executor(pool, utils.lda_topic_modeling, res, 3, 5)] if len(res) >= 3 else []
+    results = await asyncio.gather(*charts, *analysed, *lda)
+    topics = results.pop() if lda else None
+
+    paths, analyses = results[:len(STATS_CHARTS)], results[len(STATS_CHARTS):]
+    context = {key: "/" + path for (key, _, _), path in zip(STATS_CHARTS, paths)}
+    for (chart_key, _, _, data_key, _), (data, path) in zip(ANALYSIS_CHARTS, analyses):
+        context[chart_key] = "/" + path
+        context[data_key] = data
+    # The keyword chart ranks a few more words than the page lists
+    context["keywords"] = {"keywords": context["keywords"]["keywords"][:STATS_KEYWORDS]}
+    context["topics"] = topics
+    return context
 
 @app.get("/kuisioner/{kid}/stats", response_class=HTMLResponse)
-def stats(request: Request, kid: int, db: Session = Depends(get_db)):
-    k = crud.get_kuisioner(db, kid)
-    res = crud.get_responses_by_kuisioner(db, kid)
-
-    # Generate all visualizations
-    chart = utils.chart_distribution(res, f"chart_{kid}.png")
-    pie = utils.create_pie_chart(res, f"pie_{kid}.png")
-    wc = utils.generate_wordcloud(res, f"wc_{kid}.png")
-    sentiment_chart = utils.create_sentiment_chart(res, f"sentiment_{kid}.png")
-    word_freq = utils.create_word_frequency_chart(res, f"word_freq_{kid}.png")
-    response_length = utils.create_response_length_chart(res, f"response_length_{kid}.png")
-    top_contributors = utils.create_top_contributors_chart(res, f"contributors_{kid}.png")
-    keyword_chart = utils.create_keyword_comparison_chart(res, f"keyword_chart_{kid}.png")
-    stats_dashboard = utils.create_comprehensive_stats_chart(res, f"stats_dashboard_{kid}.png")
-
-    # Get text analytics
-    topics = utils.lda_topic_modeling(res, n_topics=3, n_words=5) if len(res) >= 3 else None
-    keywords = utils.extract_keywords(res, top_n=10)
-    sentiment = utils.analyze_sentiment(res)
-    text_stats = utils.text_statistics(res)
+async def stats(request: Request, kid: int, db: AsyncSession = Depends(get_db)):
+    # Header row plus the cache version (charts only change when a new response arrives), one query
+    k, latest = await crud.get_kuisioner_with_latest_response(db, kid)
+    if k is None:
+        raise HTTPException(status_code=404, detail="Kuisioner tidak ditemukan")
+    key = f"stats:{kid}:{latest}"
+    context = await cache.get_json(key)
+    if context is None:
+        res = utils.ResponseColumns(await crud.get_responses_by_kuisioner(db, kid))
+        # Return the connection to the pool before the slow render; k stays usable (already loaded)
+        await db.close()
+        # Charts and NLP are CPU-bound; keep them off the event loop (and off the GIL)
+        context = await build_stats(request.app.state.cpu_pool, res, kid)
+        await cache.set_json(key, context, cache.STATS_TTL)
 
     return templates.TemplateResponse("stats.html", {
         "request": request,
         "kuisioner": k,
-        "chart": "/" + chart,
-        "pie": "/" + pie,
-        "wc": "/" + wc,
-        "sentiment_chart": "/" + sentiment_chart,
-        "word_freq": "/" + word_freq,
-        "response_length": "/" + response_length,
-        "top_contributors": "/" + top_contributors,
-        "keyword_chart": "/" + keyword_chart,
-        "stats_dashboard": "/" + stats_dashboard,
-        "topics": topics,
-        "keywords": keywords,
-        "sentiment": sentiment,
-        "text_stats": text_stats
+        **context
     })
 
 @app.get("/kuisioner/{kid}/analytics")
-def text_analytics(kid: int, db: Session = Depends(get_db)):
+async def text_analytics(request: Request, kid: int, db: AsyncSession = Depends(get_db)):
     """
     Comprehensive text analytics endpoint
     Returns: LDA topics, keywords, sentiment analysis, and text statistics
     """
-    res = crud.get_responses_by_kuisioner(db, kid)
-
-    if not res:
+    # No responses means nothing to analyse; answer before fetching any rows
+    latest = await crud.get_latest_response_id(db, kid)
+    if latest is None:
         return {"error": "No responses found for this kuisioner"}
 
-    # Perform all text analytics
-    topics = utils.lda_topic_modeling(res, n_topics=3, n_words=5)
-    keywords = utils.extract_keywords(res, top_n=10)
-    sentiment = utils.analyze_sentiment(res)
-    stats = utils.text_statistics(res)
+    key = f"analytics:{kid}:{latest}"
+    analytics = await cache.get_json(key)
+    if analytics is None:
+        res = utils.ResponseColumns(await crud.get_responses_by_kuisioner(db, kid))
+        await db.close()  # don't hold a pooled connection while the workers run
+        lda_topics, keywords, sentiment, text_stats = await run_text_analytics(request.app.state.cpu_pool, res)
+        analytics = {
+            "lda_topics": lda_topics,
+            "keywords": keywords,
+            "sentiment_analysis": sentiment,
+            "text_stats": text_stats
+        }
+        await cache.set_json(key, analytics, cache.STATS_TTL)
 
     return {
         "kuisioner_id": kid,
-        "lda_topics": topics,
-        "keywords": keywords,
-        "sentiment_analysis": sentiment,
-        "text_stats": stats
+        **analytics
     }
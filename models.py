@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime, UniqueConstraint, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime, UniqueConstraint, Boolean, Index, JSON
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from database import Base
 import datetime
@@ -14,6 +15,10 @@ class User(Base):
     kuisioners = relationship("Kuisioner", back_populates="owner")
     responses = relationship("Response", back_populates="user")
 
+    def to_dict(self):
+        return {"id": self.id, "nama": self.nama, "email": self.email,
+                "role": self.role, "photo_url": self.photo_url}
+
 
 class Kuisioner(Base):
     __tablename__ = "kuisioners"
@@ -26,7 +31,7 @@ class Kuisioner(Base):
     start_date = Column(DateTime, default=datetime.datetime.utcnow)
     end_date = Column(DateTime, nullable=True)
     access = Column(String(20), default="public")  # public / unesa_only
-    owner_id = Column(Integer, ForeignKey("users.id"))
+    owner_id = Column(Integer, ForeignKey("users.id"), index=True)
 
     owner = relationship("User", back_populates="kuisioners")
     questions = relationship("Question", back_populates="kuisioner")
@@ -35,16 +40,21 @@ class Kuisioner(Base):
 class Question(Base):
     __tablename__ = "questions"
     id = Column(Integer, primary_key=True, index=True)
-    kuisioner_id = Column(Integer, ForeignKey("kuisioners.id"))
+    kuisioner_id = Column(Integer, ForeignKey("kuisioners.id"), index=True)
     text = Column(Text, nullable=False)
     qtype = Column(String(50), default="short_text")
-    options = Column(Text)  # JSON string
+    options = Column(JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), "postgresql"))  # list of choices, decoded by the driver
     media_url = Column(String(300))
     required = Column(Boolean, default=False)
 
     kuisioner = relationship("Kuisioner", back_populates="questions")
     responses = relationship("Response", back_populates="question")
 
+    @property
+    def options_list(self) -> list:
+        """Options for templates; [] for questions without choices"""
+        return self.options or []
+
 
 class Response(Base):
     __tablename__ = "responses"
@@ -58,5 +68,10 @@ class Response(Base):
     question = relationship("Question", back_populates="responses")
 
     __table_args__ = (
+        # Also the user_id index: its btree leads with user_id
         UniqueConstraint("user_id", "question_id", name="unique_user_response"),
+        # Same columns as the constraint, reversed on purpose: stats, export, the latest-response
+        # version and kuisioner deletion all filter responses by question_id alone, which the
+        # user_id-led constraint btree can't serve; user_id rides along for the join to users
+        Index("ix_responses_question_user", "question_id", "user_id"),
     )
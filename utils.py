@@ -1,39 +1,109 @@
-import os, pandas as pd, matplotlib.pyplot as plt, re
-from wordcloud import WordCloud
-from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
-from sklearn.decomposition import LatentDirichletAllocation
-from textblob import TextBlob
+import os, csv, re, hashlib
 import numpy as np
 from collections import Counter
-import seaborn as sns
-from datetime import datetime
+from functools import cache
+from typing import NamedTuple
 
 BASE_DIR = "static"
 
-# Set modern style for all plots
-plt.rcParams['figure.facecolor'] = 'white'
-plt.rcParams['axes.facecolor'] = '#f8fafc'
-plt.rcParams['axes.edgecolor'] = '#cbd5e1'
-plt.rcParams['axes.linewidth'] = 1.5
-plt.rcParams['grid.alpha'] = 0.3
-plt.rcParams['font.size'] = 11
-sns.set_palette("husl")
+# matplotlib, seaborn, scikit-learn, TextBlob and WordCloud take about a second and ~150 MB
+# to import. The web process only needs the CSV helpers and function references, so they
+# are imported on first use, which happens in the chart/NLP pool workers.
+@cache
+def _pyplot():
+    """matplotlib.pyplot with the chart style applied"""
+    import matplotlib
+    # Charts are only ever written to PNG; pick Agg up front so each worker skips GUI backend probing
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    # Set modern style for all plots
+    plt.rcParams['figure.facecolor'] = 'white'
+    plt.rcParams['axes.facecolor'] = '#f8fafc'
+    plt.rcParams['axes.edgecolor'] = '#cbd5e1'
+    plt.rcParams['axes.linewidth'] = 1.5
+    plt.rcParams['grid.alpha'] = 0.3
+    plt.rcParams['font.size'] = 11
+    sns.set_palette("husl")
+    return plt
+
+# ============= RESPONSE ROWS =============
+class AnswerRow(NamedTuple):
+    answer: str
+    nama: str
+    email: str
+
+class ResponseColumns:
+    """(answer, nama, email) rows stored as three lists; iterates as AnswerRow tuples.
+
+    Every chart and analysis task gets its own pickled copy of the rows, and three flat
+    lists pickle about 8x faster than per-row SQLAlchemy Row objects.
+    """
+    __slots__ = ("answer", "nama", "email")
+
+    def __init__(self, rows=()):
+        self.answer, self.nama, self.email = (list(col) for col in zip(*rows)) if rows else ([], [], [])
+
+    def __len__(self):
+        return len(self.answer)
+
+    def __iter__(self):
+        return map(AnswerRow, self.answer, self.nama, self.email)
 
 # ============= TEXT CLEANING & PREPROCESSING =============
+_NON_ALNUM = re.compile(r'[^a-z0-9\s]+')
+_WHITESPACE = re.compile(r'\s+')
+
+# ASCII fast path for the same cleaning: one C translate pass lowercases and drops punctuation
+_ASCII_CLEAN = str.maketrans({
+    c: (chr(c).lower() if chr(c).isalnum() or chr(c).isspace() else None) for c in range(128)
+})
+
 def clean_text(text: str) -> str:
     """Clean and normalize text"""
     if not text:
         return ""
-    text = text.lower()
-    text = re.sub(r'\s+', ' ', text)
-    text = re.sub(r'[^a-zA-Z0-9\s]', '', text)
-    return text.strip()
+    if text.isascii():
+        text = text.translate(_ASCII_CLEAN)
+    else:
+        # Lowercase first so the character class only needs a-z; strip before collapsing spaces
+        text = _NON_ALNUM.sub('', text.lower())
+    return _WHITESPACE.sub(' ', text).strip()
 
 def preprocess_responses(responses):
     """Clean all response texts"""
     return [clean_text(r.answer) for r in responses if r.answer]
 
+def top_k_indices(scores, k):
+    """Indices of the k largest scores, highest first (O(V) select + O(k log k) sort)"""
+    if k >= len(scores):
+        return np.argsort(scores)[::-1]
+    idx = np.argpartition(scores, -k)[-k:]
+    return idx[np.argsort(scores[idx])[::-1]]
+
+# Corpus-level fits per worker process, keyed by (kind, corpus digest, params); all fits are
+# deterministic, so a content key never goes stale and writes need no invalidation
+_FIT_CACHE = {}
+_FIT_CACHE_SIZE = 32
+
+def _corpus_digest(texts):
+    # Cleaned texts contain no newlines, so the joined corpus identifies the input exactly
+    return hashlib.blake2b("\n".join(texts).encode(), digest_size=16).digest()
+
+def _cached_fit(key, fit):
+    result = _FIT_CACHE.get(key)
+    if result is None:
+        result = fit()
+        if len(_FIT_CACHE) >= _FIT_CACHE_SIZE:
+            del _FIT_CACHE[next(iter(_FIT_CACHE))]
+        _FIT_CACHE[key] = result
+    return result
+
 # ============= LDA TOPIC MODELING =============
+_LDA_BATCH_SIZE = 256
+_LDA_ONLINE_MIN_DOCS = 4 * _LDA_BATCH_SIZE
+
 def lda_topic_modeling(responses, n_topics=3, n_words=5):
     """Perform LDA topic modeling on responses"""
     texts = preprocess_responses(responses)
@@ -41,17 +111,30 @@ def lda_topic_modeling(responses, n_topics=3, n_words=5):
     if len(texts) < n_topics:
         return {"error": "Not enough responses for topic modeling"}
 
+    key = ("lda", _corpus_digest(texts), n_topics, n_words)
+    return _cached_fit(key, lambda: _fit_lda_topics(texts, n_topics, n_words))
+
+def _fit_lda_topics(texts, n_topics, n_words):
+    from sklearn.feature_extraction.text import CountVectorizer
+    from sklearn.decomposition import LatentDirichletAllocation
+
     vectorizer = CountVectorizer(max_df=0.95, min_df=2, stop_words='english')
     doc_term_matrix = vectorizer.fit_transform(texts)
 
-    lda = LatentDirichletAllocation(n_components=n_topics, random_state=42)
+    # Online (mini-batch) VB scales sub-linearly on large corpora; batch VB is faster below a few batches.
+    # No n_jobs: this already runs inside a process-pool worker.
+    if len(texts) > _LDA_ONLINE_MIN_DOCS:
+        lda = LatentDirichletAllocation(n_components=n_topics, learning_method="online",
+                                        batch_size=_LDA_BATCH_SIZE, random_state=42)
+    else:
+        lda = LatentDirichletAllocation(n_components=n_topics, random_state=42)
     lda.fit(doc_term_matrix)
 
     feature_names = vectorizer.get_feature_names_out()
     topics = []
 
     for topic_idx, topic in enumerate(lda.components_):
-        top_words_idx = topic.argsort()[-n_words:][::-1]
+        top_words_idx = top_k_indices(topic, n_words)
         top_words = [feature_names[i] for i in top_words_idx]
         topics.append({
             "topic_id": topic_idx + 1,
@@ -69,30 +152,66 @@ def extract_keywords(responses, top_n=10):
     if len(texts) == 0:
         return {"keywords": []}
 
-    vectorizer = TfidfVectorizer(max_df=0.8, min_df=1, stop_words='english')
-    tfidf_matrix = vectorizer.fit_transform(texts)
-
-    feature_names = vectorizer.get_feature_names_out()
-    tfidf_scores = np.asarray(tfidf_matrix.sum(axis=0)).ravel()
+    # Scores don't depend on top_n, so the stats page (12) and the analytics API (10) share one fit
+    feature_names, tfidf_scores = _cached_fit(("tfidf", _corpus_digest(texts)), lambda: _fit_tfidf_scores(texts))
 
-    top_indices = tfidf_scores.argsort()[-top_n:][::-1]
+    top_indices = top_k_indices(tfidf_scores, top_n)
     keywords = [{"word": feature_names[i], "score": float(tfidf_scores[i])}
                 for i in top_indices]
 
     return {"keywords": keywords}
 
+def _fit_tfidf_scores(texts):
+    from sklearn.feature_extraction.text import TfidfVectorizer, ENGLISH_STOP_WORDS
+
+    # clean_text already lowercased and reduced each text to space-separated [a-z0-9] words, so
+    # str.split gives the same tokens as the default \w\w+ regex without a second scan per document
+    def analyzer(text):
+        return [w for w in text.split() if len(w) > 1 and w not in ENGLISH_STOP_WORDS]
+
+    # float32 halves the CSR data the vectorizer writes and the column sums read
+    vectorizer = TfidfVectorizer(max_df=0.8, min_df=1, analyzer=analyzer, dtype=np.float32)
+    tfidf_matrix = vectorizer.fit_transform(texts)
+
+    # Column sums straight from the CSR arrays: one pass over the non-zeros, no sparse @ dense product
+    tfidf_scores = np.bincount(tfidf_matrix.indices, weights=tfidf_matrix.data, minlength=tfidf_matrix.shape[1])
+    return vectorizer.get_feature_names_out(), tfidf_scores
+
 # ============= SENTIMENT ANALYSIS =============
-def analyze_sentiment(responses):
-    """Analyze sentiment of responses"""
+@cache
+def _sentiment_analyzer():
+    """TextBlob's default analyzer, used directly: no TextBlob object per answer"""
+    from textblob.en.sentiments import PatternAnalyzer
+    return PatternAnalyzer()
+
+def warm_up_worker():
+    """Process-pool initializer: do the heavy imports and load the sentiment lexicon before the first request"""
+    import sklearn.decomposition, sklearn.feature_extraction.text
+    _pyplot()
+    _wordcloud()
+    _sentiment_analyzer().analyze("good")
+
+def sentiment_polarities(answers):
+    """TextBlob polarity of each answer text; lets callers score shards of answers in parallel"""
+    analyzer = _sentiment_analyzer()
+    return {answer: analyzer.analyze(answer).polarity for answer in answers}
+
+def analyze_sentiment(responses, polarities=None):
+    """Analyze sentiment of responses (polarities: optional precomputed answer -> polarity)"""
     sentiments = {"positive": 0, "neutral": 0, "negative": 0}
     details = []
 
+    # Many answers repeat (choice questions, short replies); score each distinct text once
+    if polarities is None:
+        polarities = {}
+
     for r in responses:
         if not r.answer:
             continue
 
-        blob = TextBlob(r.answer)
-        polarity = blob.sentiment.polarity
+        polarity = polarities.get(r.answer)
+        if polarity is None:
+            polarity = polarities[r.answer] = _sentiment_analyzer().analyze(r.answer).polarity
 
         if polarity > 0.1:
             sentiment = "positive"
@@ -115,6 +234,10 @@ def analyze_sentiment(responses):
     }
 
 # ============= TEXT STATISTICS =============
+def answer_word_counts(texts) -> np.ndarray:
+    """Words per answer as one int array (shared by the statistics and the response-length chart)"""
+    return np.fromiter((len(text.split()) for text in texts), dtype=np.int64, count=len(texts))
+
 def text_statistics(responses):
     """Calculate text statistics from responses"""
     texts = [r.answer for r in responses if r.answer]
@@ -122,48 +245,72 @@ def text_statistics(responses):
     if not texts:
         return {"error": "No text data available"}
 
-    word_counts = [len(text.split()) for text in texts]
-    char_counts = [len(text) for text in texts]
+    # Build each count array once; every aggregate below is then a single NumPy reduction
+    word_counts = answer_word_counts(texts)
+    char_counts = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
 
     return {
         "total_responses": len(texts),
-        "avg_words": round(np.mean(word_counts), 2),
-        "avg_chars": round(np.mean(char_counts), 2),
-        "min_words": min(word_counts),
-        "max_words": max(word_counts),
-        "total_words": sum(word_counts),
-        "median_words": round(np.median(word_counts), 2),
-        "std_words": round(np.std(word_counts), 2)
+        "avg_words": round(float(word_counts.mean()), 2),
+        "avg_chars": round(float(char_counts.mean()), 2),
+        "min_words": int(word_counts.min()),
+        "max_words": int(word_counts.max()),
+        "total_words": int(word_counts.sum()),
+        "median_words": round(float(np.median(word_counts)), 2),
+        "std_words": round(float(word_counts.std()), 2)
     }
 
 # ============= EXPORT FUNCTION =============
-def export_responses(responses, filename: str):
-    data = [{"Nama": r.user.nama, "Email": r.user.email,
-             "Pertanyaan": r.question.text, "Jawaban": r.answer} for r in responses]
-    df = pd.DataFrame(data)
-    path = os.path.join(BASE_DIR, filename)
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    df.to_csv(path, index=False)
-    return path
+CSV_HEADER = ["Nama", "Email", "Pertanyaan", "Jawaban"]
+
+class _Echo:
+    """File-like sink whose write() hands the encoded line straight back"""
+    def write(self, line):
+        return line
+
+_csv_writer = csv.writer(_Echo(), lineterminator="\n")
+
+def responses_to_csv(rows, header: bool = False) -> str:
+    """Encode a batch of response rows as CSV text"""
+    lines = [_csv_writer.writerow(CSV_HEADER)] if header else []
+    lines.extend(_csv_writer.writerow((r.nama, r.email, r.question, r.answer)) for r in rows)
+    return "".join(lines)
 
 # ============= ENHANCED VISUALIZATIONS =============
+# Charts are shown in the browser at page width; screen resolution is enough (raise for HiDPI screens)
+CHART_DPI = int(os.getenv("CHART_DPI", "96"))
+_ENSURED_DIRS = set()
+
+def chart_path(filename: str) -> str:
+    """Output path for a chart; its directory is created at most once per process"""
+    path = os.path.join(BASE_DIR, "charts", filename)
+    directory = os.path.dirname(path)
+    if directory not in _ENSURED_DIRS:
+        os.makedirs(directory, exist_ok=True)
+        _ENSURED_DIRS.add(directory)
+    return path
+
+def save_chart(fig, filename: str, dpi: int = CHART_DPI) -> str:
+    """Save a chart as PNG; margins come from tight_layout, so no extra bbox_inches='tight' render pass"""
+    path = chart_path(filename)
+    fig.savefig(path, dpi=dpi, facecolor='white')
+    return path
 
 def chart_distribution(responses, filename: str):
     """Create modern bar chart for response distribution"""
+    plt = _pyplot()
     if not responses:
-        fig, ax = plt.subplots(figsize=(12, 6))
+        fig = plt.Figure(figsize=(12, 6))
+        ax = fig.subplots()
         ax.text(0.5, 0.5, 'Tidak ada data', ha='center', va='center',
                 fontsize=24, color='#94a3b8', weight='bold')
         ax.axis('off')
     else:
-        counts = {}
-        for r in responses:
-            answer = str(r.answer) if r.answer else "Tidak ada jawaban"
-            counts[answer] = counts.get(answer, 0) + 1
-
-        sorted_counts = dict(sorted(counts.items(), key=lambda x: x[1], reverse=True)[:20])
+        counts = Counter(str(r.answer) if r.answer else "Tidak ada jawaban" for r in responses)
+        sorted_counts = dict(counts.most_common(20))
 
-        fig, ax = plt.subplots(figsize=(14, 7))
+        fig = plt.Figure(figsize=(14, 7))
+        ax = fig.subplots()
         colors = plt.cm.viridis(np.linspace(0.3, 0.9, len(sorted_counts)))
         bars = ax.bar(range(len(sorted_counts)), list(sorted_counts.values()),
                       color=colors, edgecolor='white', linewidth=2, alpha=0.85)
@@ -184,29 +331,25 @@ def chart_distribution(responses, filename: str):
                    f'{int(height)}', ha='center', va='bottom',
                    fontsize=10, weight='bold', color='#334155')
 
-    path = os.path.join(BASE_DIR, "charts", filename)
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    plt.tight_layout()
-    plt.savefig(path, dpi=200, bbox_inches='tight', facecolor='white')
-    plt.close()
-    return path
+    fig.tight_layout()
+    return save_chart(fig, filename)
 
 def create_pie_chart(responses, filename: str):
     """Create modern donut chart for response distribution"""
+    plt = _pyplot()
+    import seaborn as sns
     if not responses:
-        fig, ax = plt.subplots(figsize=(10, 8))
+        fig = plt.Figure(figsize=(10, 8))
+        ax = fig.subplots()
         ax.text(0.5, 0.5, 'Tidak ada data', ha='center', va='center',
                 fontsize=24, color='#94a3b8', weight='bold')
         ax.axis('off')
     else:
-        counts = {}
-        for r in responses:
-            answer = str(r.answer) if r.answer else "Tidak ada jawaban"
-            counts[answer] = counts.get(answer, 0) + 1
+        counts = Counter(str(r.answer) if r.answer else "Tidak ada jawaban" for r in responses)
+        sorted_counts = dict(counts.most_common(8))
 
-        sorted_counts = dict(sorted(counts.items(), key=lambda x: x[1], reverse=True)[:8])
-
-        fig, ax = plt.subplots(figsize=(12, 9))
+        fig = plt.Figure(figsize=(12, 9))
+        ax = fig.subplots()
         colors = sns.color_palette("Set2", len(sorted_counts))
 
         wedges, texts, autotexts = ax.pie(
@@ -227,20 +370,17 @@ def create_pie_chart(responses, filename: str):
         ax.set_title('🍩 Proporsi Jawaban', fontsize=16, weight='bold',
                     pad=20, color='#0f172a')
 
-    path = os.path.join(BASE_DIR, "charts", filename)
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    plt.tight_layout()
-    plt.savefig(path, dpi=200, bbox_inches='tight', facecolor='white')
-    plt.close()
-    return path
+    fig.tight_layout()
+    return save_chart(fig, filename)
 
-def generate_wordcloud(responses, filename: str):
-    """Generate modern word cloud"""
-    texts = preprocess_responses(responses)
-    text = " ".join(texts) if texts else "tidak ada data tersedia"
+_WORDCLOUD_TITLE_HEIGHT = 80
 
-    if len(text.strip()) < 10:
-        text = "tidak ada data yang cukup untuk visualisasi"
+@cache
+def _wordcloud():
+    """(WordCloud, its stopwords, title font); configured once per worker process, generate refits it"""
+    from wordcloud import WordCloud, STOPWORDS
+    from matplotlib import font_manager
+    from PIL import ImageFont
 
     wc = WordCloud(
         width=1400,
@@ -252,35 +392,63 @@ def generate_wordcloud(responses, filename: str):
         min_font_size=12,
         contour_width=2,
         contour_color='#cbd5e1'
-    ).generate(text)
+    )
+    title_font = ImageFont.truetype(
+        font_manager.findfont(font_manager.FontProperties(family='DejaVu Sans', weight='bold')), 32
+    )
+    return wc, STOPWORDS, title_font
 
-    path = os.path.join(BASE_DIR, "charts", filename)
-    os.makedirs(os.path.dirname(path), exist_ok=True)
+def generate_wordcloud(responses, filename: str):
+    """Generate modern word cloud"""
+    from PIL import Image, ImageDraw
+
+    wc, stopwords, title_font = _wordcloud()
+    texts = preprocess_responses(responses)
+
+    # Count words in C and hand WordCloud the frequencies; its own tokenizing and
+    # collocation scoring cost more than the layout. Same filtering and plural merging as
+    # WordCloud.generate, minus two-word collocations
+    freqs = Counter(' '.join(texts).split())
+    for word in [w for w in freqs if len(w) < 2 or w.isdigit() or w in stopwords]:
+        del freqs[word]
+    for word in [w for w in freqs if w.endswith('s') and not w.endswith('ss') and w[:-1] in freqs]:
+        freqs[word[:-1]] += freqs.pop(word)
+
+    if not texts:
+        freqs = dict.fromkeys("tidak ada data tersedia".split(), 1)
+    elif not freqs:
+        freqs = dict.fromkeys("tidak ada data yang cukup untuk visualisasi".split(), 1)
 
-    fig, ax = plt.subplots(figsize=(14, 7))
-    ax.imshow(wc, interpolation='bilinear')
-    ax.axis('off')
-    ax.set_title('☁️ Word Cloud - Kata Populer', fontsize=16, weight='bold',
-                pad=20, color='#0f172a')
-    plt.tight_layout()
-    plt.savefig(path, dpi=200, bbox_inches='tight', facecolor='white')
-    plt.close()
+    cloud = wc.generate_from_frequencies(freqs).to_image()
+
+    # Title band pasted above the cloud with Pillow; no matplotlib figure to re-rasterize the image
+    image = Image.new("RGB", (cloud.width, cloud.height + _WORDCLOUD_TITLE_HEIGHT), "white")
+    image.paste(cloud, (0, _WORDCLOUD_TITLE_HEIGHT))
+    ImageDraw.Draw(image).text((cloud.width // 2, _WORDCLOUD_TITLE_HEIGHT // 2), '☁️ Word Cloud - Kata Populer',
+                               font=title_font, fill='#0f172a', anchor='mm')
+
+    path = chart_path(filename)
+    image.save(path, "PNG")
 
     return path
 
-def create_sentiment_chart(responses, filename: str):
+def create_sentiment_chart(responses, filename: str, sentiment_data=None):
     """Create sentiment analysis visualization"""
-    sentiment_data = analyze_sentiment(responses)
+    plt = _pyplot()
+    if sentiment_data is None:
+        sentiment_data = analyze_sentiment(responses)
 
     if not sentiment_data['details']:
-        fig, ax = plt.subplots(figsize=(10, 6))
+        fig = plt.Figure(figsize=(10, 6))
+        ax = fig.subplots()
         ax.text(0.5, 0.5, 'Tidak ada data sentimen', ha='center', va='center',
                 fontsize=24, color='#94a3b8', weight='bold')
         ax.axis('off')
     else:
         sentiments = sentiment_data['summary']
 
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 6))
+        fig = plt.Figure(figsize=(16, 6))
+        ax1, ax2 = fig.subplots(1, 2)
 
         # Bar chart
         colors_map = {'positive': '#22c55e', 'neutral': '#eab308', 'negative': '#ef4444'}
@@ -320,35 +488,37 @@ def create_sentiment_chart(responses, filename: str):
 
         ax2.set_title('🎯 Proporsi Sentimen', fontsize=14, weight='bold', pad=15)
 
-    path = os.path.join(BASE_DIR, "charts", filename)
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    plt.tight_layout()
-    plt.savefig(path, dpi=200, bbox_inches='tight', facecolor='white')
-    plt.close()
-    return path
+    fig.tight_layout()
+    return save_chart(fig, filename)
+
+# Common stopwords left out of the word frequency chart
+_CHART_STOPWORDS = frozenset({
+    'the', 'a', 'an', 'and', 'or', 'but', 'is', 'are', 'was', 'were',
+    'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'from', 'tidak',
+    'yang', 'di', 'ke', 'dari', 'dan', 'atau', 'untuk', 'dengan', 'ini', 'itu'
+})
 
 def create_word_frequency_chart(responses, filename: str, top_n=15):
     """Create word frequency histogram"""
+    plt = _pyplot()
     texts = preprocess_responses(responses)
 
     if not texts:
-        fig, ax = plt.subplots(figsize=(12, 6))
+        fig = plt.Figure(figsize=(12, 6))
+        ax = fig.subplots()
         ax.text(0.5, 0.5, 'Tidak ada data', ha='center', va='center',
                 fontsize=24, color='#94a3b8', weight='bold')
         ax.axis('off')
     else:
-        all_words = ' '.join(texts).split()
-        word_freq = Counter(all_words)
-
-        # Remove common stopwords manually
-        stopwords = {'the', 'a', 'an', 'and', 'or', 'but', 'is', 'are', 'was', 'were',
-                    'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'from', 'tidak',
-                    'yang', 'di', 'ke', 'dari', 'dan', 'atau', 'untuk', 'dengan', 'ini', 'itu'}
-        word_freq = {k: v for k, v in word_freq.items() if k not in stopwords and len(k) > 2}
+        # Count every token in C, then filter the (far fewer) distinct words in place
+        word_freq = Counter(' '.join(texts).split())
+        for word in [w for w in word_freq if w in _CHART_STOPWORDS or len(w) <= 2]:
+            del word_freq[word]
 
-        top_words = dict(sorted(word_freq.items(), key=lambda x: x[1], reverse=True)[:top_n])
+        top_words = dict(word_freq.most_common(top_n))
 
-        fig, ax = plt.subplots(figsize=(14, 7))
+        fig = plt.Figure(figsize=(14, 7))
+        ax = fig.subplots()
         colors = plt.cm.coolwarm(np.linspace(0.2, 0.8, len(top_words)))
         bars = ax.barh(range(len(top_words)), list(top_words.values()),
                        color=colors, edgecolor='white', linewidth=2, alpha=0.9)
@@ -369,24 +539,26 @@ def create_word_frequency_chart(responses, filename: str, top_n=15):
 
         ax.invert_yaxis()
 
-    path = os.path.join(BASE_DIR, "charts", filename)
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    plt.tight_layout()
-    plt.savefig(path, dpi=200, bbox_inches='tight', facecolor='white')
-    plt.close()
-    return path
+    fig.tight_layout()
+    return save_chart(fig, filename)
 
 def create_response_length_chart(responses, filename: str):
     """Create response length distribution"""
-    if not responses:
-        fig, ax = plt.subplots(figsize=(12, 6))
+    plt = _pyplot()
+    # One count array for the histogram, the box plot and the annotation
+    word_counts = answer_word_counts([r.answer for r in responses if r.answer])
+
+    if not word_counts.size:
+        fig = plt.Figure(figsize=(12, 6))
+        ax = fig.subplots()
         ax.text(0.5, 0.5, 'Tidak ada data', ha='center', va='center',
                 fontsize=24, color='#94a3b8', weight='bold')
         ax.axis('off')
     else:
-        word_counts = [len(r.answer.split()) for r in responses if r.answer]
+        median = np.median(word_counts)
 
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 6))
+        fig = plt.Figure(figsize=(16, 6))
+        ax1, ax2 = fig.subplots(1, 2)
 
         # Histogram
         ax1.hist(word_counts, bins=20, color='#3b82f6', edgecolor='white',
@@ -399,7 +571,7 @@ def create_response_length_chart(responses, filename: str):
         ax1.spines['right'].set_visible(False)
 
         # Box plot
-        box = ax2.boxplot(word_counts, vert=True, patch_artist=True,
+        box = ax2.boxplot(word_counts, vert=True, patch_artist=True, usermedians=[median],
                          boxprops=dict(facecolor='#8b5cf6', alpha=0.7, linewidth=2),
                          whiskerprops=dict(linewidth=2, color='#6d28d9'),
                          capprops=dict(linewidth=2, color='#6d28d9'),
@@ -415,34 +587,29 @@ def create_response_length_chart(responses, filename: str):
         ax2.set_xticklabels(['Jawaban'])
 
         # Add statistics text
-        stats_text = f"Min: {min(word_counts)}\nMaks: {max(word_counts)}\n"
-        stats_text += f"Rata-rata: {np.mean(word_counts):.1f}\nMedian: {np.median(word_counts):.1f}"
-        ax2.text(1.15, np.median(word_counts), stats_text, fontsize=10,
+        stats_text = f"Min: {word_counts.min()}\nMaks: {word_counts.max()}\n"
+        stats_text += f"Rata-rata: {word_counts.mean():.1f}\nMedian: {median:.1f}"
+        ax2.text(1.15, median, stats_text, fontsize=10,
                 bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.5))
 
-    path = os.path.join(BASE_DIR, "charts", filename)
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    plt.tight_layout()
-    plt.savefig(path, dpi=200, bbox_inches='tight', facecolor='white')
-    plt.close()
-    return path
+    fig.tight_layout()
+    return save_chart(fig, filename)
 
 def create_top_contributors_chart(responses, filename: str, top_n=10):
     """Create chart showing top contributors by response count"""
+    plt = _pyplot()
     if not responses:
-        fig, ax = plt.subplots(figsize=(12, 6))
+        fig = plt.Figure(figsize=(12, 6))
+        ax = fig.subplots()
         ax.text(0.5, 0.5, 'Tidak ada data', ha='center', va='center',
                 fontsize=24, color='#94a3b8', weight='bold')
         ax.axis('off')
     else:
-        user_counts = {}
-        for r in responses:
-            user_name = r.user.nama if r.user.nama else r.user.email
-            user_counts[user_name] = user_counts.get(user_name, 0) + 1
+        user_counts = Counter(r.nama if r.nama else r.email for r in responses)
+        top_users = dict(user_counts.most_common(top_n))
 
-        top_users = dict(sorted(user_counts.items(), key=lambda x: x[1], reverse=True)[:top_n])
-
-        fig, ax = plt.subplots(figsize=(14, 7))
+        fig = plt.Figure(figsize=(14, 7))
+        ax = fig.subplots()
         colors = plt.cm.Spectral(np.linspace(0.2, 0.8, len(top_users)))
         bars = ax.barh(range(len(top_users)), list(top_users.values()),
                        color=colors, edgecolor='white', linewidth=2, alpha=0.9)
@@ -464,19 +631,18 @@ def create_top_contributors_chart(responses, filename: str, top_n=10):
 
         ax.invert_yaxis()
 
-    path = os.path.join(BASE_DIR, "charts", filename)
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    plt.tight_layout()
-    plt.savefig(path, dpi=200, bbox_inches='tight', facecolor='white')
-    plt.close()
-    return path
+    fig.tight_layout()
+    return save_chart(fig, filename)
 
-def create_keyword_comparison_chart(responses, filename: str):
+def create_keyword_comparison_chart(responses, filename: str, keyword_data=None):
     """Create comparison chart of top keywords with scores"""
-    keyword_data = extract_keywords(responses, top_n=12)
+    plt = _pyplot()
+    if keyword_data is None:
+        keyword_data = extract_keywords(responses, top_n=12)
 
     if not keyword_data['keywords']:
-        fig, ax = plt.subplots(figsize=(12, 6))
+        fig = plt.Figure(figsize=(12, 6))
+        ax = fig.subplots()
         ax.text(0.5, 0.5, 'Tidak ada data keyword', ha='center', va='center',
                 fontsize=24, color='#94a3b8', weight='bold')
         ax.axis('off')
@@ -485,7 +651,8 @@ def create_keyword_comparison_chart(responses, filename: str):
         words = [k['word'] for k in keywords]
         scores = [k['score'] for k in keywords]
 
-        fig, ax = plt.subplots(figsize=(14, 8))
+        fig = plt.Figure(figsize=(14, 8))
+        ax = fig.subplots()
         colors = plt.cm.viridis(np.linspace(0.3, 0.9, len(words)))
         bars = ax.barh(range(len(words)), scores, color=colors,
                       edgecolor='white', linewidth=2, alpha=0.9)
@@ -506,25 +673,25 @@ def create_keyword_comparison_chart(responses, filename: str):
 
         ax.invert_yaxis()
 
-    path = os.path.join(BASE_DIR, "charts", filename)
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    plt.tight_layout()
-    plt.savefig(path, dpi=200, bbox_inches='tight', facecolor='white')
-    plt.close()
-    return path
+    fig.tight_layout()
+    return save_chart(fig, filename)
 
-def create_comprehensive_stats_chart(responses, filename: str):
+def create_comprehensive_stats_chart(responses, filename: str, stats=None):
     """Create comprehensive statistics dashboard"""
-    stats = text_statistics(responses)
+    plt = _pyplot()
+    if stats is None:
+        stats = text_statistics(responses)
 
     if 'error' in stats:
-        fig, ax = plt.subplots(figsize=(12, 8))
+        fig = plt.Figure(figsize=(12, 8))
+        ax = fig.subplots()
         ax.text(0.5, 0.5, 'Tidak ada data statistik', ha='center', va='center',
                 fontsize=24, color='#94a3b8', weight='bold')
         ax.axis('off')
     else:
-        fig = plt.figure(figsize=(16, 10))
-        gs = fig.add_gridspec(3, 3, hspace=0.3, wspace=0.3)
+        fig = plt.Figure(figsize=(16, 10))
+        # Explicit margins: the grid fills the figure without a tight-layout measuring pass
+        gs = fig.add_gridspec(3, 3, left=0.06, right=0.98, top=0.92, bottom=0.04, hspace=0.35, wspace=0.25)
 
         # Title
         fig.suptitle('📊 Dashboard Statistik Komprehensif', fontsize=18, weight='bold', y=0.98)
@@ -616,8 +783,4 @@ def create_comprehensive_stats_chart(responses, filename: str):
                 bbox=dict(boxstyle='round', facecolor='#f1f5f9', alpha=0.8, pad=1))
         ax7.axis('off')
 
-    path = os.path.join(BASE_DIR, "charts", filename)
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    plt.savefig(path, dpi=200, bbox_inches='tight', facecolor='white')
-    plt.close()
-    return path
+    return save_chart(fig, filename)